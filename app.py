@@ -1,10 +1,11 @@
 import streamlit as st
-from audio_generator import generate_from_prompt, save_wav, remix_audio_from_file
+from audio_generator import generate_from_prompt, encode_wav, remix_audio_from_file, SAMPLE_RATE
+from mixer import Source, mix
+from peaks import schedule_peaks, waveform
 from musicgen_integration import is_musicgen_available, generate_with_musicgen
-import downloader
-import tempfile
 import os
-from library import list_tracks, add_track, list_playlists, add_playlist, add_track_to_playlist, list_tracks_in_playlist
+import re
+from library import list_tracks, add_track, store_audio, list_playlists, add_playlist, add_track_to_playlist, list_tracks_in_playlist
 
 
 st.set_page_config(page_title="M Music App", layout="wide")
@@ -21,12 +22,11 @@ upload_file = st.sidebar.file_uploader('Upload MP3/WAV', type=['mp3', 'wav'])
 song_title = st.sidebar.text_input('Title (optional)')
 song_artist = st.sidebar.text_input('Artist (optional)')
 if st.sidebar.button('Add uploaded song to library') and upload_file:
-    lib_dir = os.path.join(os.path.dirname(__file__), 'library')
-    os.makedirs(lib_dir, exist_ok=True)
     filename = upload_file.name
-    dest = os.path.join(lib_dir, filename)
-    with open(dest, 'wb') as f:
-        f.write(upload_file.getbuffer())
+    stem, ext = os.path.splitext(filename)
+    # unique name + atomic rename, so sessions uploading the same filename don't clobber each other
+    safe_stem = re.sub(r'[^\w.-]+', '_', stem)[:40] or 'upload'
+    dest = store_audio(upload_file.getbuffer(), prefix=safe_stem, ext=ext.lower() or '.wav')
     meta_title = song_title or os.path.splitext(filename)[0]
     prompt = f"Imported: {meta_title} by {song_artist}" if song_artist else f"Imported: {meta_title}"
     add_track(title=meta_title, file_path=dest, duration=0.0, prompt=prompt)
@@ -46,6 +46,7 @@ if st.sidebar.button('Import from URL') and url_to_import:
     else:
         with st.spinner('Downloading audio...'):
             try:
+                import downloader  # pulls in yt_dlp; only load it when a URL import is requested
                 dl_path = downloader.download_audio_from_url(url_to_import)
                 title = os.path.splitext(os.path.basename(dl_path))[0]
                 add_track(title=title, file_path=dl_path, duration=0.0, prompt=f'Imported from {url_to_import}')
@@ -126,6 +127,12 @@ q_index = st.session_state.get('queue_index', 0)
 if queue and 0 <= q_index < len(queue):
     cur = queue[q_index]
     st.write(f"Now playing: **{cur.get('title')}**")
+    # waveform comes from the precomputed peaks sidecar; nothing is decoded here
+    wave = waveform(cur.get('file', ''), width=400)
+    if wave is not None:
+        st.area_chart({'max': wave[1], 'min': wave[0]}, height=100)
+    elif cur.get('file') and os.path.exists(cur['file']):
+        schedule_peaks(cur['file'])
     try:
         st.audio(open(cur.get('file'), 'rb').read(), format='audio/wav')
     except Exception:
@@ -163,23 +170,20 @@ if mode == 'Generate':
                     signal = generate_from_prompt(prompt, duration=duration, style=style, mood=mood)
             else:
                 signal = generate_from_prompt(prompt, duration=duration, style=style, mood=mood)
-            tmpdir = tempfile.gettempdir()
-            out_path = os.path.join(tmpdir, 'ai_music_output.wav')
-            save_wav(signal, out_path)
-
+            # encode once and keep the WAV bytes in this session; playback, download and
+            # Save to Library all reuse them instead of going through a shared temp file
+            st.session_state['generated'] = {'wav': encode_wav(signal), 'prompt': prompt, 'duration': duration}
         st.success('Done — play below')
-        audio_file = open(out_path, 'rb')
-        audio_bytes = audio_file.read()
-        st.audio(audio_bytes, format='audio/wav')
-        st.download_button('Download WAV', data=audio_bytes, file_name='ai_music_output.wav')
+
+    generated = st.session_state.get('generated')
+    if generated:
+        st.audio(generated['wav'], format='audio/wav')
+        st.download_button('Download WAV', data=generated['wav'], file_name='ai_music_output.wav')
         if st.button('Save to Library'):
-            # copy file to library folder
-            lib_dir = os.path.join(os.path.dirname(__file__), 'library')
-            os.makedirs(lib_dir, exist_ok=True)
-            dest = os.path.join(lib_dir, f"gen_{int(os.path.getmtime(out_path))}.wav")
-            with open(out_path, 'rb') as src, open(dest, 'wb') as dst:
-                dst.write(src.read())
-            add_track(title=prompt[:60] or 'Generated track', file_path=dest, duration=duration, prompt=prompt)
+            dest = store_audio(generated['wav'], prefix='gen')
+            gen_prompt = generated['prompt']
+            add_track(title=gen_prompt[:60] or 'Generated track', file_path=dest, duration=generated['duration'], prompt=gen_prompt)
+            st.session_state.pop('generated', None)
             st.success('Saved to library')
 
 else:  
@@ -188,32 +192,46 @@ else:
     overlay_prompt = st.text_input('Optional motif prompt to overlay (short)')
     intensity = st.slider('Remix intensity', min_value=0.0, max_value=1.0, value=0.5)
     mood = st.slider('Mood (calm -> energetic)', min_value=-1.0, max_value=1.0, value=0.0)
+    # optional extra layers from the library, mixed block-wise under the remix
+    layer_tracks = [t for t in list_tracks() if t.get('file')]
+    layer_choices = st.multiselect('Layer library tracks (optional)', layer_tracks,
+                                   format_func=lambda t: t.get('title') or 'Untitled', key='remix_layers')
+    layer_sources = []
+    for t in layer_choices:
+        with st.expander(f"Layer: {t.get('title')}"):
+            gain = st.slider('Gain', min_value=0.0, max_value=1.0, value=0.4, key=f"lgain_{t['id']}")
+            offset = st.number_input('Start at (seconds)', min_value=0.0, value=0.0, key=f"loff_{t['id']}")
+            loop = st.checkbox('Loop', value=False, key=f"lloop_{t['id']}")
+            layer_sources.append(Source(t['file'], gain=gain, offset=offset, loop=loop))
     if st.button('Remix'):
         if not uploaded:
             st.warning('Please upload a file first')
         else:
-            tmpdir = tempfile.gettempdir()
-            in_path = os.path.join(tmpdir, uploaded.name)
-            with open(in_path, 'wb') as f:
-                f.write(uploaded.getbuffer())
             with st.spinner('Remixing...'):
-                signal = remix_audio_from_file(in_path, intensity=intensity, overlay_prompt=overlay_prompt or None, mood=mood)
-                out_path = os.path.join(tmpdir, 'ai_music_remix.wav')
-                save_wav(signal, out_path)
-
+                # decode straight from the upload buffer — no temp copy of the upload
+                uploaded.seek(0)
+                signal = remix_audio_from_file(uploaded, intensity=intensity, overlay_prompt=overlay_prompt or None, mood=mood)
+                if layer_sources:
+                    try:
+                        signal = mix([Source(signal), *layer_sources], length=len(signal))
+                    except Exception as e:
+                        st.error(f'Could not mix layers: {e}')
+                st.session_state['remixed'] = {
+                    'wav': encode_wav(signal),
+                    'prompt': overlay_prompt,
+                    'duration': len(signal) / SAMPLE_RATE,
+                }
             st.success('Remix done — play below')
-            audio_file = open(out_path, 'rb')
-            audio_bytes = audio_file.read()
-            st.audio(audio_bytes, format='audio/wav')
-            st.download_button('Download Remix WAV', data=audio_bytes, file_name='ai_music_remix.wav')
-            if st.button('Save Remix to Library'):
-                lib_dir = os.path.join(os.path.dirname(__file__), 'library')
-                os.makedirs(lib_dir, exist_ok=True)
-                dest = os.path.join(lib_dir, f"remix_{int(os.path.getmtime(out_path))}.wav")
-                with open(out_path, 'rb') as src, open(dest, 'wb') as dst:
-                    dst.write(src.read())
-                add_track(title=(overlay_prompt or 'Remix')[:60], file_path=dest, duration=0.0, prompt=overlay_prompt)
-                st.success('Saved remix to library')
+
+    remixed = st.session_state.get('remixed')
+    if remixed:
+        st.audio(remixed['wav'], format='audio/wav')
+        st.download_button('Download Remix WAV', data=remixed['wav'], file_name='ai_music_remix.wav')
+        if st.button('Save Remix to Library'):
+            dest = store_audio(remixed['wav'], prefix='remix')
+            add_track(title=(remixed['prompt'] or 'Remix')[:60], file_path=dest, duration=remixed['duration'], prompt=remixed['prompt'])
+            st.session_state.pop('remixed', None)
+            st.success('Saved remix to library')
 
 st.markdown('---')
 st.header('Next steps / integration')
@@ -1,24 +1,35 @@
-import numpy as np
-import soundfile as sf
-from scipy.signal import butter, lfilter
+import io
 import os
+from typing import BinaryIO, Union
+
+import numpy as np
+
+from tracing import span, traced
 
 SAMPLE_RATE = 44100
 
 
+# scipy.signal, soundfile and librosa are imported inside the functions that use them so that
+# importing this module (e.g. on every Streamlit rerun) only costs numpy.
+
+
 def _butter_lowpass(cutoff, fs, order=5):
+    from scipy.signal import butter
     nyq = 0.5 * fs
     normal_cutoff = cutoff / nyq
     b, a = butter(order, normal_cutoff, btype='low', analog=False)
     return b, a
 
 
+@traced('audio._lowpass_filter')
 def _lowpass_filter(data, cutoff=4000, fs=SAMPLE_RATE, order=6):
+    from scipy.signal import lfilter
     b, a = _butter_lowpass(cutoff, fs, order=order)
     y = lfilter(b, a, data)
     return y
 
 
+@traced('audio.generate_from_prompt')
 def generate_from_prompt(prompt: str, duration=15, style='lofi', mood: float = 0.0) -> np.ndarray:
     """Simple heuristic generator: create base sine + noise depending on prompt keywords.
 
@@ -66,15 +77,18 @@ def generate_from_prompt(prompt: str, duration=15, style='lofi', mood: float = 0
     return signal.astype('float32')
 
 
-def remix_audio_from_file(path: str, intensity: float = 0.5, overlay_prompt: str = None, mood: float = 0.0) -> np.ndarray:
+@traced('audio.remix_audio_from_file')
+def remix_audio_from_file(path: Union[str, BinaryIO], intensity: float = 0.5, overlay_prompt: str = None, mood: float = 0.0) -> np.ndarray:
     """A simple remix: read audio file, time-stretch/pitch-shift a bit and optionally overlay a short generated motif.
 
+    path: a file path or a readable binary file object (e.g. a Streamlit upload), decoded in place.
     intensity: 0.0..1.0 how strong the remix effects are.
     overlay_prompt: optional prompt to synthesize a short motif to overlay.
     mood: forwarded to generator if overlay is used.
     """
     import soundfile as sf
-    data, sr = sf.read(path, dtype='float32')
+    with span('remix.decode'):
+        data, sr = sf.read(path, dtype='float32')
     # mix to mono
     if data.ndim > 1:
         data = np.mean(data, axis=1)
@@ -84,7 +98,8 @@ def remix_audio_from_file(path: str, intensity: float = 0.5, overlay_prompt: str
         import librosa
         # librosa expects float64 mono at its sample rate — convert if needed
         if sr != SAMPLE_RATE:
-            data = librosa.resample(data.astype('float32'), orig_sr=sr, target_sr=SAMPLE_RATE)
+            with span('remix.resample'):
+                data = librosa.resample(data.astype('float32'), orig_sr=sr, target_sr=SAMPLE_RATE)
             sr = SAMPLE_RATE
         else:
             data = data.astype('float32')
@@ -96,12 +111,14 @@ def remix_audio_from_file(path: str, intensity: float = 0.5, overlay_prompt: str
 
         # librosa.effects.time_stretch requires mono
         y = librosa.to_mono(data) if data.ndim > 1 else data
-        stretched = librosa.effects.time_stretch(y, rate=stretch_rate)
+        with span('remix.stretch'):
+            stretched = librosa.effects.time_stretch(y, rate=stretch_rate)
 
         # slight pitch shift for creative remixing (in semitones)
         semitones = (intensity - 0.5) * 4.0  # -2 .. +2 semitones
         if abs(semitones) > 0.01:
-            stretched = librosa.effects.pitch_shift(stretched, sr=SAMPLE_RATE, n_steps=semitones)
+            with span('remix.pitch'):
+                stretched = librosa.effects.pitch_shift(stretched, sr=SAMPLE_RATE, n_steps=semitones)
 
     except Exception:
         # Fallback to naive resampling if librosa is not available or fails
@@ -111,11 +128,12 @@ def remix_audio_from_file(path: str, intensity: float = 0.5, overlay_prompt: str
         if factor <= 0:
             factor = 0.5
         new_len = int(len(data) / factor)
-        try:
-            stretched = resample(data, new_len)
-        except Exception:
-            # fallback: naive repeat/truncate
-            stretched = np.interp(np.linspace(0, len(data), new_len), np.arange(len(data)), data)
+        with span('remix.stretch'):
+            try:
+                stretched = resample(data, new_len)
+            except Exception:
+                # fallback: naive repeat/truncate
+                stretched = np.interp(np.linspace(0, len(data), new_len), np.arange(len(data)), data)
 
     # apply a simple lowpass/highpass depending on intensity
     if intensity > 0.6:
@@ -125,13 +143,12 @@ def remix_audio_from_file(path: str, intensity: float = 0.5, overlay_prompt: str
 
     # overlay generated motif if requested
     if overlay_prompt:
-        motif = generate_from_prompt(overlay_prompt, duration=min(8, len(processed)/SAMPLE_RATE), style='default', mood=mood)
-        # trim or pad motif
-        if len(motif) < len(processed):
-            motif = np.pad(motif, (0, len(processed) - len(motif)))
-        else:
-            motif = motif[:len(processed)]
-        processed = (1.0 - intensity) * processed + intensity * 0.6 * motif
+        with span('remix.overlay'):
+            from mixer import Source, mix
+            motif = generate_from_prompt(overlay_prompt, duration=min(8, len(processed)/SAMPLE_RATE), style='default', mood=mood)
+            # block-wise sum; the motif simply ends early instead of being zero-padded to full length
+            processed = mix([Source(processed, gain=1.0 - intensity), Source(motif, gain=intensity * 0.6)],
+                            length=len(processed), normalize=False)
 
     # normalize
     maxv = np.max(np.abs(processed))
@@ -141,6 +158,21 @@ def remix_audio_from_file(path: str, intensity: float = 0.5, overlay_prompt: str
     return processed.astype('float32')
 
 
+@traced('audio.save_wav')
 def save_wav(signal: np.ndarray, out_path: str):
+    import soundfile as sf
     os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
     sf.write(out_path, signal, SAMPLE_RATE, subtype='PCM_16')
+
+
+@traced('audio.encode_wav')
+def encode_wav(signal: np.ndarray) -> bytes:
+    """Encode a signal as 16-bit PCM WAV in memory (same format as `save_wav`).
+
+    The returned bytes can be handed straight to `st.audio` / `st.download_button` and later
+    committed to the library with `library.store_audio`, so a render is encoded exactly once.
+    """
+    import soundfile as sf
+    buf = io.BytesIO()
+    sf.write(buf, signal, SAMPLE_RATE, subtype='PCM_16', format='WAV')
+    return buf.getvalue()
@@ -0,0 +1,65 @@
+"""Regression check: chunked resampling in mixer._FileReader must match whole-file resample_poly.
+
+Usage:
+    python check_mixer_resample.py
+
+Writes short float32 test files at several sample rates and lengths (shorter than, and
+spanning, several resample chunks), reads them back through `mixer.mix` both straight and
+looped, and compares against `scipy.signal.resample_poly` over the whole signal. Exits
+non-zero on any mismatch, so changes to the chunk or pad sizes stay honest.
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from audio_generator import SAMPLE_RATE
+from mixer import Source, mix
+
+RATES = [8000, 11025, 22050, 32000, 48000, 96000]
+LENGTHS = [50, 1000, 200000]
+TOLERANCE = 1e-6
+
+
+def check(sr: int, frames: int, channels: int, tmpdir: str) -> float:
+    import soundfile as sf
+    from scipy.signal import resample_poly
+
+    rng = np.random.default_rng(sr + frames + channels)
+    mono = (rng.standard_normal(frames) * 0.2).astype('float32')
+    data = np.stack([mono] * channels, axis=1) if channels > 1 else mono
+    path = os.path.join(tmpdir, f'in_{sr}_{frames}_{channels}.wav')
+    sf.write(path, data, sr, subtype='FLOAT')
+
+    g = int(np.gcd(sr, SAMPLE_RATE))
+    expected = resample_poly(mono.astype('float64'), SAMPLE_RATE // g, sr // g)
+
+    straight = mix([Source(path)], normalize=False, block_size=4099)
+    if len(straight) != len(expected):
+        raise AssertionError(f'{sr} Hz x {frames}: length {len(straight)} != {len(expected)}')
+    looped = mix([Source(path, loop=True)], length=2 * len(expected) + 7, normalize=False, block_size=10007)
+    tiled = np.concatenate([expected, expected, expected[:7]])
+    return float(max(np.abs(straight - expected).max(), np.abs(looped - tiled).max()))
+
+
+def main() -> int:
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for sr in RATES:
+            for frames in LENGTHS:
+                for channels in (1, 2):
+                    try:
+                        err = check(sr, frames, channels, tmpdir)
+                        ok = err <= TOLERANCE
+                        detail = f'max error {err:.2e}'
+                    except AssertionError as e:
+                        ok, detail = False, str(e)
+                    failures += not ok
+                    print(f"{'ok  ' if ok else 'FAIL'} {sr:>6} Hz {frames:>7} frames {channels}ch  {detail}")
+    print(f'\n{failures} failure(s)' if failures else '\nall resampling checks passed')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
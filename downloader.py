@@ -1,5 +1,4 @@
 import os
-from yt_dlp import YoutubeDL
 from typing import Optional
 
 LIB_DIR = os.path.join(os.path.dirname(__file__), 'library')
@@ -9,8 +8,11 @@ os.makedirs(LIB_DIR, exist_ok=True)
 def download_audio_from_url(url: str, title_hint: Optional[str] = None) -> str:
     """Download best audio from the provided URL and return the saved file path.
 
-    Requires yt-dlp to be installed.
+    Requires yt-dlp to be installed. It is imported here rather than at module level so the
+    app does not pay for it until a URL import is actually requested.
     """
+    from yt_dlp import YoutubeDL
+
     opts = {
         'format': 'bestaudio/best',
         'outtmpl': os.path.join(LIB_DIR, '%(title)s.%(ext)s'),
@@ -1,4 +1,4 @@
-"""Import all mp3/wav files from a folder into the app library (copy files and register them).
+"""Import all mp3/wav files from a folder into the app library (hardlink or copy files and register them).
 
 Usage:
     python import_folder.py "C:\path\to\telugu_songs"
@@ -7,23 +7,19 @@ This script is provided for convenience. Make sure you have the right to use/cop
 """
 import sys
 import os
-from library import add_track
+from library import add_track, link_audio
 
 
 def import_folder(src_folder: str):
     if not os.path.isdir(src_folder):
         print(f"Not a folder: {src_folder}")
         return
-    dest_dir = os.path.join(os.path.dirname(__file__), 'library')
-    os.makedirs(dest_dir, exist_ok=True)
     count = 0
     for fname in os.listdir(src_folder):
         if not fname.lower().endswith(('.mp3', '.wav')):
             continue
         src = os.path.join(src_folder, fname)
-        dest = os.path.join(dest_dir, fname)
-        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
-            fdst.write(fsrc.read())
+        dest = link_audio(src, fname)
         add_track(title=os.path.splitext(fname)[0], file_path=dest, duration=0.0, prompt='Imported folder')
         count += 1
     print(f"Imported {count} files from {src_folder}")
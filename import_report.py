@@ -0,0 +1,105 @@
+"""Report the import cost of the app's modules and of the heavy dependencies they defer.
+
+Usage:
+    python import_report.py
+
+Timings come from ``-X importtime`` in fresh interpreters (best of a few runs). The "app
+startup" row is every module `app.py` imports at top level, read from its source (Streamlit
+excluded). Each "deferred" row is what that dependency adds *on top of* app startup: it is
+imported after the startup modules in the same interpreter and only the newly loaded
+modules are summed, so shared dependencies such as numpy are not counted again. Only dependencies the app used to import eagerly are listed.
+"""
+import ast
+import os
+import subprocess
+import sys
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+# imported on every run before the lazy-import change: audio_generator pulled in scipy.signal
+# and soundfile, app.py imported downloader (yt_dlp), and the MusicGen probe imported
+# audiocraft (which loads torch). librosa was already imported lazily, so it is not listed.
+DEFERRED_MODULES = ['scipy.signal', 'soundfile', 'yt_dlp', 'audiocraft']
+REPEATS = 3
+
+
+def app_modules(path: str = APP_FILE):
+    """Return the modules `path` imports at module level (not inside functions or branches)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    mods = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            if name.split('.')[0] != 'streamlit' and name not in mods:
+                mods.append(name)
+    return mods
+
+
+def _top_level_imports(statement: str):
+    """Run ``statement`` under ``-X importtime``; return [(module, cumulative us)] for the
+    unindented (top-level) entries, or None if the statement fails."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return None
+    entries = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"; top-level imports are unindented
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line.split('|')
+        if len(parts) == 3 and not parts[2].startswith('  '):
+            entries.append((parts[2].strip(), int(parts[1].strip())))
+    return entries
+
+
+def import_time_us(statement: str, already_loaded=()):
+    """Cumulative import time in microseconds for ``statement``, or None on failure.
+
+    Top-level entries for modules in ``already_loaded`` are skipped, which isolates the
+    cost a later import adds on top of those modules in the same interpreter.
+    """
+    entries = _top_level_imports(statement)
+    if entries is None:
+        return None
+    return sum(us for mod, us in entries if mod not in already_loaded)
+
+
+def best_import_time_us(statement: str, already_loaded=()):
+    times = [import_time_us(statement, already_loaded) for _ in range(REPEATS)]
+    return None if None in times else min(times)
+
+
+def main():
+    rows = []
+    modules = app_modules()
+    startup_stmt = '; '.join(f'import {m}' for m in modules)
+    startup = best_import_time_us(startup_stmt)
+    rows.append(('app startup (' + ', '.join(modules) + ')', startup))
+    startup_entries = _top_level_imports(startup_stmt) or []
+    loaded = {mod for mod, _ in startup_entries}
+    for mod in DEFERRED_MODULES:
+        # same interpreter as startup, so only modules startup did not load are counted
+        extra = best_import_time_us(f'{startup_stmt}; import {mod}', loaded) if startup is not None else None
+        rows.append((f'deferred: {mod} (on top of startup)', extra))
+
+    width = max(len(name) for name, _ in rows)
+    for name, us in rows:
+        cost = 'not installed' if us is None else f'{us / 1000:.1f} ms'
+        print(f'{name:<{width}}  {cost}')
+
+    # deferred dependencies may share imports with each other, so the sum is an upper bound
+    deferred = sum(us for name, us in rows[1:] if us is not None)
+    if startup is not None and deferred:
+        print(f'\nStartup now defers up to {deferred / 1000:.1f} ms of imports until the features need them.')
+
+
+if __name__ == '__main__':
+    main()
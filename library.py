@@ -4,12 +4,15 @@ import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from tracing import traced
+
 LIB_FILE = os.path.join(os.path.dirname(__file__), 'library.json')
 LIB_DIR = os.path.join(os.path.dirname(__file__), 'library')
 
 os.makedirs(LIB_DIR, exist_ok=True)
 
 
+@traced('library._load')
 def _load() -> Dict:
     """Return a dict with keys: 'tracks' (list) and 'playlists' (list).
     Keep backwards compatibility when the file contains a raw list of tracks.
@@ -31,144 +34,73 @@ def _load() -> Dict:
         return {'tracks': [], 'playlists': []}
 
 
+@traced('library._save')
 def _save(state: Dict):
-    with open(LIB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
-
-
-def list_tracks() -> List[Dict]:
-    return _load().get('tracks', [])
-
-
-def add_track(title: str, file_path: str, duration: float = 0.0, prompt: Optional[str] = None) -> Dict:
-    state = _load()
-    tracks = state.get('tracks', [])
-    track = {
-        'id': str(uuid.uuid4()),
-        'title': title,
-        'file': os.path.abspath(file_path),
-        'duration': float(duration),
-        'prompt': prompt or '',
-        'created_at': datetime.utcnow().isoformat() + 'Z'
-    }
-    tracks.insert(0, track)
-    state['tracks'] = tracks
-    _save(state)
-    return track
-
-
-def find_track(track_id: str) -> Optional[Dict]:
-    tracks = _load().get('tracks', [])
-    for t in tracks:
-        if t.get('id') == track_id:
-            return t
-    return None
-
-
-def list_playlists() -> List[Dict]:
-    return _load().get('playlists', [])
-
-
-def add_playlist(name: str) -> Dict:
-    state = _load()
-    playlists = state.get('playlists', [])
-    pl = {'id': str(uuid.uuid4()), 'name': name, 'track_ids': []}
-    playlists.append(pl)
-    state['playlists'] = playlists
-    _save(state)
-    return pl
-
-
-def add_track_to_playlist(playlist_id: str, track_id: str) -> bool:
-    state = _load()
-    playlists = state.get('playlists', [])
-    for pl in playlists:
-        if pl.get('id') == playlist_id:
-            if track_id not in pl.get('track_ids', []):
-                pl.setdefault('track_ids', []).append(track_id)
-                state['playlists'] = playlists
-                _save(state)
-            return True
-    return False
-
-
-def list_tracks_in_playlist(playlist_id: str) -> List[Dict]:
-    state = _load()
-    playlists = state.get('playlists', [])
-    tracks = state.get('tracks', [])
-    for pl in playlists:
-        if pl.get('id') == playlist_id:
-            ids = pl.get('track_ids', [])
-            return [t for t in tracks if t.get('id') in ids]
-    return []
-import json
-import os
-import uuid
-from datetime import datetime
-from typing import Dict, List, Optional
-
-LIB_FILE = os.path.join(os.path.dirname(__file__), 'library.json')
-LIB_DIR = os.path.join(os.path.dirname(__file__), 'library')
-
-os.makedirs(LIB_DIR, exist_ok=True)
-
-
-def _load() -> List[Dict]:
-    if not os.path.exists(LIB_FILE):
-        return []
+    # write a sibling temp file and rename it over LIB_FILE, so a concurrent _load never
+    # sees a truncated file (which it would otherwise read as an empty library)
+    tmp_path = f"{LIB_FILE}.{uuid.uuid4().hex}.part"
     try:
-        with open(LIB_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
-
-def _load() -> Dict:
-    """Return a dict with keys: 'tracks' (list) and 'playlists' (list).
-    Keep backwards compatibility when the file contains a raw list of tracks.
+        with open(tmp_path, 'x', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, LIB_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_audio(data: bytes, prefix: str = 'track', ext: str = '.wav') -> str:
+    """Write encoded audio into LIB_DIR under a unique name and return its path.
+
+    The bytes are written once to a uniquely named temp file inside LIB_DIR and then
+    atomically renamed into place, so readers never see a partial file and concurrent
+    sessions never collide on a shared name. The file is created with plain `open`, so its
+    mode follows the umask like any other library file.
     """
-    if not os.path.exists(LIB_FILE):
-        return {'tracks': [], 'playlists': []}
+    os.makedirs(LIB_DIR, exist_ok=True)
+    tmp_path = os.path.join(LIB_DIR, f".{prefix}_{uuid.uuid4().hex}.part")
     try:
-        with open(LIB_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return {'tracks': data, 'playlists': []}
-            if isinstance(data, dict):
-                # ensure keys exist
-                return {
-                    'tracks': data.get('tracks', []),
-                    'playlists': data.get('playlists', []),
-                }
-            return {'tracks': [], 'playlists': []}
-    except Exception:
-        return {'tracks': [], 'playlists': []}
-
-def _save(all_tracks: List[Dict]):
-    with open(LIB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(all_tracks, f, ensure_ascii=False, indent=2)
+        with open(tmp_path, 'xb') as f:
+            f.write(data)
+        dest = os.path.join(LIB_DIR, f"{prefix}_{uuid.uuid4().hex[:12]}{ext}")
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return dest
+
+
+def link_audio(src_path: str, filename: Optional[str] = None) -> str:
+    """Bring an existing audio file into LIB_DIR without rewriting its contents.
+
+    Uses a hardlink when source and library share a filesystem and falls back to a copy
+    otherwise. Either way the result is renamed into place atomically, replacing any
+    existing file of the same name. Returns the path inside LIB_DIR.
+    """
+    import shutil
+    os.makedirs(LIB_DIR, exist_ok=True)
+    dest = os.path.join(LIB_DIR, filename or os.path.basename(src_path))
+    if os.path.exists(dest) and os.path.samefile(src_path, dest):
+        return dest
+    tmp_path = os.path.join(LIB_DIR, f".link_{uuid.uuid4().hex}.part")
+    try:
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return dest
 
-def _save(state: Dict):
-    with open(LIB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
 
 def list_tracks() -> List[Dict]:
-    return _load()
+    return _load().get('tracks', [])
 
 
-def add_track(title: str, file_path: str, duration: float = 0.0, prompt: Optional[str] = None) -> Dict:
-    tracks = _load()
-    track = {
-        'id': str(uuid.uuid4()),
-        'title': title,
-        'file': os.path.abspath(file_path),
-        'duration': float(duration),
-        'prompt': prompt or '',
-        'created_at': datetime.utcnow().isoformat() + 'Z'
-    }
-    tracks.insert(0, track)
-    _save(tracks)
-    return track
-
 def add_track(title: str, file_path: str, duration: float = 0.0, prompt: Optional[str] = None) -> Dict:
     state = _load()
     tracks = state.get('tracks', [])
@@ -183,15 +115,13 @@ def add_track(title: str, file_path: str, duration: float = 0.0, prompt: Optiona
     tracks.insert(0, track)
     state['tracks'] = tracks
     _save(state)
+    # waveform peaks are built off the calling thread; see peaks.py
+    from peaks import schedule_peaks
+    schedule_peaks(track['file'])
     return track
 
-def find_track(track_id: str) -> Optional[Dict]:
-    tracks = _load()
-    for t in tracks:
-        if t.get('id') == track_id:
-            return t
-    return None
 
+def find_track(track_id: str) -> Optional[Dict]:
     tracks = _load().get('tracks', [])
     for t in tracks:
         if t.get('id') == track_id:
@@ -234,4 +164,4 @@ def list_tracks_in_playlist(playlist_id: str) -> List[Dict]:
         if pl.get('id') == playlist_id:
             ids = pl.get('track_ids', [])
             return [t for t in tracks if t.get('id') in ids]
-    return []
\ No newline at end of file
+    return []
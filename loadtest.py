@@ -0,0 +1,105 @@
+"""Local load test for server.py: requests/sec and latency percentiles.
+
+Usage:
+    python server.py --port 8765 &
+    python loadtest.py --url http://127.0.0.1:8765/generate --requests 200 --concurrency 16
+    python loadtest.py --url http://127.0.0.1:8765/generate --unique   # defeat request coalescing
+    python loadtest.py --url http://127.0.0.1:8765/tracks --method GET
+
+Each of the `--concurrency` clients holds one keep-alive connection and sends requests back
+to back until `--requests` have completed in total. Standard library only.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    length = 0
+    for line in lines[1:]:
+        if line.lower().startswith('content-length:'):
+            length = int(line.split(':', 1)[1])
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, method, path, make_body, counter, total, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            n = counter[0]
+            if n >= total:
+                return
+            counter[0] += 1
+            body = make_body(n)
+            request = (f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n'
+                       f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode('latin-1') + body
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[idx]
+
+
+async def run(url: str, method: str, total: int, concurrency: int, body: dict, unique: bool):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+
+    def make_body(n: int) -> bytes:
+        if method == 'GET':
+            return b''
+        payload = dict(body)
+        if unique:
+            payload['prompt'] = f"{payload.get('prompt', '')} #{n}"
+        return json.dumps(payload).encode('utf-8')
+
+    counter, latencies, errors = [0], [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, method, path, make_body, counter, total, latencies, errors)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    lat = sorted(latencies)
+    print(f'{method} {url}')
+    print(f'requests:    {len(lat)} ({len(errors)} errors) with {concurrency} connections')
+    print(f'throughput:  {len(lat) / elapsed:.1f} req/s over {elapsed:.2f} s')
+    if lat:
+        print(f'latency:     mean {statistics.mean(lat) * 1000:.1f} ms, p50 {_percentile(lat, 50) * 1000:.1f} ms, '
+              f'p95 {_percentile(lat, 95) * 1000:.1f} ms, max {lat[-1] * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the M Music App HTTP API')
+    parser.add_argument('--url', default='http://127.0.0.1:8765/generate')
+    parser.add_argument('--method', default='POST')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--body', default='{"prompt": "calm lofi piano", "duration": 2}', help='JSON body for POST')
+    parser.add_argument('--unique', action='store_true', help='make every prompt distinct so nothing is coalesced')
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.method.upper(), args.requests, args.concurrency, json.loads(args.body), args.unique))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""Multi-track mixing engine.
+
+Sums any number of sources (library tracks, generated layers, overlays) into one float32
+buffer, block by block. Each source has its own gain, start offset and loop flag; sources are
+never padded or copied to full length, so working memory beyond the output itself is one
+block-sized scratch buffer plus whatever each file reader holds for a block.
+
+    from mixer import Source, mix
+    out = mix([
+        Source(remixed),                                  # in-memory array at SAMPLE_RATE
+        Source('library/sample_Lofi Rain.wav', gain=0.4, loop=True),
+        Source(motif, gain=0.3, offset=2.0),              # starts 2 s in
+    ])
+"""
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from audio_generator import SAMPLE_RATE
+from tracing import traced
+
+DEFAULT_BLOCK_SIZE = 65536
+
+
+class Source:
+    """One input to `mix`.
+
+    data: a mono/stereo numpy array at SAMPLE_RATE, or a path to an audio file.
+    gain: linear gain applied to the source.
+    offset: start time in seconds within the mix.
+    loop: repeat the source until the end of the mix.
+    """
+
+    def __init__(self, data: Union[np.ndarray, str], gain: float = 1.0, offset: float = 0.0, loop: bool = False):
+        self.data = data
+        self.gain = float(gain)
+        self.offset = max(0.0, float(offset))
+        self.loop = bool(loop)
+
+    def __repr__(self):
+        kind = self.data if isinstance(self.data, str) else f'array[{len(self.data)}]'
+        return f'Source({kind!r}, gain={self.gain}, offset={self.offset}, loop={self.loop})'
+
+
+class _ArrayReader:
+    def __init__(self, data: np.ndarray):
+        data = np.asarray(data)
+        if data.ndim > 1:
+            # (N, channels) like soundfile, or (channels, N) like torch/librosa
+            data = data.mean(axis=1) if data.shape[0] >= data.shape[1] else data.mean(axis=0)
+        self._data = data
+        self.frames = len(data)
+
+    def read(self, pos: int, out: np.ndarray):
+        out[:] = self._data[pos:pos + len(out)]
+
+    def close(self):
+        pass
+
+
+class _FileReader:
+    """Streams frames from disk.
+
+    Files at another sample rate are resampled chunk by chunk with `resample_poly`: each
+    chunk is decoded with `pad` input frames of context on both sides and the filtered edges
+    are trimmed, so the output matches resampling the whole file while only one chunk is
+    held in memory. Chunk and pad lengths are multiples of the decimation factor so chunk
+    boundaries land on exact output samples.
+    """
+
+    RESAMPLE_CHUNK = 65536
+
+    def __init__(self, path: str):
+        import soundfile as sf
+        self._file = sf.SoundFile(path)
+        self._pos = 0
+        sr = self._file.samplerate
+        self._in_frames = self._file.frames
+        if sr == SAMPLE_RATE:
+            self._up = self._down = 1
+            self.frames = self._in_frames
+            return
+        g = int(np.gcd(sr, SAMPLE_RATE))
+        self._up, self._down = SAMPLE_RATE // g, sr // g
+        up, down = self._up, self._down
+        # resample_poly's default filter spans 10 * max(up, down) taps each side at the
+        # upsampled rate, i.e. ~10 * max(up, down) / up input frames of context
+        half = 10 * max(up, down) // up + 2
+        self._pad = -(-half // down) * down
+        self._chunk_in = max(1, self.RESAMPLE_CHUNK // down) * down
+        self._chunk_out = self._chunk_in * up // down
+        self.frames = -(-self._in_frames * up // down)
+        self._chunk_index = -1
+        self._chunk = np.zeros(0, dtype='float32')
+
+    def _read_mono(self, pos: int, out: np.ndarray) -> int:
+        """Decode input frames [pos, pos + len(out)) into `out`; returns the count read."""
+        if pos != self._pos:
+            self._file.seek(pos)
+        block = self._file.read(len(out), dtype='float32', always_2d=True)
+        if block.shape[1] == 1:
+            out[:len(block)] = block[:, 0]
+        else:
+            np.mean(block, axis=1, out=out[:len(block)])
+        self._pos = pos + len(block)
+        return len(block)
+
+    def _resampled_chunk(self, k: int) -> np.ndarray:
+        if k != self._chunk_index:
+            from scipy.signal import resample_poly
+            pad, up, down = self._pad, self._up, self._down
+            first = k * self._chunk_in - pad
+            buf = np.zeros(self._chunk_in + 2 * pad, dtype='float32')
+            lo, hi = max(0, first), min(self._in_frames, first + len(buf))
+            if hi > lo:
+                self._read_mono(lo, buf[lo - first:hi - first])
+            y = resample_poly(buf, up, down)
+            trim = pad * up // down
+            n = min(self._chunk_out, self.frames - k * self._chunk_out)
+            self._chunk = y[trim:trim + n].astype('float32')
+            self._chunk_index = k
+        return self._chunk
+
+    def read(self, pos: int, out: np.ndarray):
+        if self._up == self._down:
+            n = self._read_mono(pos, out)
+            out[n:] = 0.0
+            return
+        filled = 0
+        while filled < len(out):
+            k, off = divmod(pos + filled, self._chunk_out)
+            chunk = self._resampled_chunk(k)
+            take = min(len(out) - filled, len(chunk) - off)
+            if take <= 0:
+                out[filled:] = 0.0
+                return
+            out[filled:filled + take] = chunk[off:off + take]
+            filled += take
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _open(source: Source):
+    if isinstance(source.data, str):
+        return _FileReader(source.data)
+    return _ArrayReader(source.data)
+
+
+@traced('mixer.mix')
+def mix(sources: Sequence[Source], length: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE,
+        normalize: bool = True) -> np.ndarray:
+    """Mix `sources` into a single float32 array of `length` samples at SAMPLE_RATE.
+
+    length: output length in samples; defaults to the end of the longest non-looping source.
+    normalize: peak-normalize to 0.9 like the generators do.
+    """
+    if not sources:
+        raise ValueError('mix() needs at least one source')
+    readers = []
+    try:
+        for src in sources:
+            readers.append(_open(src))
+        offsets = [int(round(src.offset * SAMPLE_RATE)) for src in sources]
+
+        if length is None:
+            ends = [off + r.frames for src, r, off in zip(sources, readers, offsets) if not src.loop]
+            if not ends:
+                raise ValueError('length is required when every source loops')
+            length = max(ends)
+
+        out = np.zeros(length, dtype='float32')
+        scratch = np.empty(block_size, dtype='float32')
+        for start in range(0, length, block_size):
+            end = min(start + block_size, length)
+            for src, reader, off in zip(sources, readers, offsets):
+                if reader.frames == 0 or src.gain == 0.0:
+                    continue
+                lo = max(start, off)
+                hi = end if src.loop else min(end, off + reader.frames)
+                if hi <= lo:
+                    continue
+                n = hi - lo
+                buf = scratch[:n]
+                pos = lo - off
+                if src.loop:
+                    filled = 0
+                    while filled < n:
+                        p = (pos + filled) % reader.frames
+                        take = min(n - filled, reader.frames - p)
+                        reader.read(p, buf[filled:filled + take])
+                        filled += take
+                else:
+                    reader.read(pos, buf)
+                if src.gain != 1.0:
+                    buf *= src.gain
+                out[lo:hi] += buf
+    finally:
+        for r in readers:
+            r.close()
+
+    if normalize:
+        maxv = np.max(np.abs(out)) if length else 0.0
+        if maxv > 0:
+            out *= 0.9 / maxv
+    return out
+
@@ -3,18 +3,27 @@
 This file intentionally does not install any heavy libraries. It tries to import them
 when `generate_with_musicgen` is called and raises a clear error if unavailable.
 """
+import functools
+import importlib.util
 from typing import Optional
 import numpy as np
 
+from tracing import span, traced
 
+
+@functools.lru_cache(maxsize=None)
 def is_musicgen_available() -> bool:
+    """Cheap, cached probe: checks that audiocraft is installed without importing it (or torch).
+
+    A broken install is still reported by `generate_with_musicgen` when it actually imports.
+    """
     try:
-        import audiocraft  # type: ignore
-        return True
-    except Exception:
+        return importlib.util.find_spec('audiocraft') is not None
+    except (ImportError, ValueError):
         return False
 
 
+@traced('musicgen.generate_with_musicgen')
 def generate_with_musicgen(prompt: str, duration: int = 15, device: str = 'cpu') -> np.ndarray:
     """Generate audio with MusicGen/audiocraft if installed.
 
@@ -31,18 +40,20 @@ def generate_with_musicgen(prompt: str, duration: int = 15, device: str = 'cpu')
         ) from e
 
     # Load model (this may download weights on first call)
-    model = MusicGen.get_pretrained('melody') if hasattr(MusicGen, 'get_pretrained') else None
-    if model is None:
-        # Fallback API attempt
-        try:
-            model = MusicGen()
-        except Exception:
-            raise RuntimeError('Failed to instantiate MusicGen model.')
+    with span('musicgen.load'):
+        model = MusicGen.get_pretrained('melody') if hasattr(MusicGen, 'get_pretrained') else None
+        if model is None:
+            # Fallback API attempt
+            try:
+                model = MusicGen()
+            except Exception:
+                raise RuntimeError('Failed to instantiate MusicGen model.')
 
-    model.to(device)
+        model.to(device)
 
     # Model generate API varies; this is a best-effort sketch.
-    out = model.generate([prompt], length=duration)
+    with span('musicgen.inference'):
+        out = model.generate([prompt], length=duration)
 
     # `out` might be a list of tensors or numpy arrays — coerce to numpy
     audio = out[0]
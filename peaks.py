@@ -0,0 +1,205 @@
+"""Precomputed waveform peaks for library tracks.
+
+`compute_peaks` makes one streaming pass over an audio file and builds a min/max pyramid:
+level 0 holds one (min, max) pair per BASE_BIN samples, each further level halves the
+resolution. The pyramid is quantized to int16 (or int8) and written to a sidecar file
+next to the audio (`<audio>.peaks.npz`). `waveform` then answers "min/max envelope of this
+range at N pixels" from the sidecar alone, without decoding any audio.
+
+`schedule_peaks` runs `ensure_peaks` on a background worker; `library.add_track` calls it so
+every ingested track gets a sidecar without blocking the caller.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+BASE_BIN = 256
+SIDECAR_SUFFIX = '.peaks.npz'
+_SCALES = {'int8': 127, 'int16': 32767}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_cache: Dict[str, Tuple[float, Dict]] = {}
+# paths queued on the worker, and paths whose last attempt failed (keyed by file signature)
+_scheduled: Dict[str, Future] = {}
+_failed: Dict[str, Optional[Tuple[float, int]]] = {}
+
+
+def sidecar_path(audio_path: str) -> str:
+    return audio_path + SIDECAR_SUFFIX
+
+
+@traced('peaks.compute_peaks')
+def compute_peaks(audio_path: str, base_bin: int = BASE_BIN, dtype: str = 'int16') -> Dict:
+    """Decode `audio_path` once, block by block, and return its peak pyramid.
+
+    Returns a dict with 'sample_rate', 'frames', 'base_bin', 'scale' and 'levels', a list of
+    (mins, maxs) integer array pairs from finest to coarsest.
+    """
+    import soundfile as sf
+    if dtype not in _SCALES:
+        raise ValueError(f'dtype must be one of {sorted(_SCALES)}')
+    scale = _SCALES[dtype]
+
+    mins, maxs = [], []
+    carry = np.empty(0, dtype='float32')
+    with sf.SoundFile(audio_path) as f:
+        sample_rate, frames = f.samplerate, f.frames
+        for block in f.blocks(blocksize=base_bin * 1024, dtype='float32', always_2d=True):
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+            if carry.size:
+                mono = np.concatenate([carry, mono])
+            n = len(mono) // base_bin * base_bin
+            if n:
+                bins = mono[:n].reshape(-1, base_bin)
+                mins.append(bins.min(axis=1))
+                maxs.append(bins.max(axis=1))
+            carry = mono[n:]
+    if carry.size:
+        mins.append(carry.min(keepdims=True))
+        maxs.append(carry.max(keepdims=True))
+
+    lo = np.concatenate(mins) if mins else np.zeros(0, dtype='float32')
+    hi = np.concatenate(maxs) if maxs else np.zeros(0, dtype='float32')
+    lo = np.round(np.clip(lo, -1.0, 1.0) * scale).astype(dtype)
+    hi = np.round(np.clip(hi, -1.0, 1.0) * scale).astype(dtype)
+
+    levels = [(lo, hi)]
+    while len(lo) > 1:
+        if len(lo) % 2:
+            lo = np.append(lo, lo[-1])
+            hi = np.append(hi, hi[-1])
+        lo = np.minimum(lo[0::2], lo[1::2])
+        hi = np.maximum(hi[0::2], hi[1::2])
+        levels.append((lo, hi))
+
+    return {'sample_rate': sample_rate, 'frames': frames, 'base_bin': base_bin, 'scale': scale, 'levels': levels}
+
+
+def save_peaks(peaks: Dict, path: str):
+    """Write a pyramid to `path` atomically (temp file + rename)."""
+    arrays = {'meta': np.array([peaks['sample_rate'], peaks['frames'], peaks['base_bin'], peaks['scale']], dtype='int64')}
+    for i, (lo, hi) in enumerate(peaks['levels']):
+        arrays[f'min_{i}'] = lo
+        arrays[f'max_{i}'] = hi
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_peaks(path: str) -> Dict:
+    """Read a sidecar written by `save_peaks`; cached per path until the file changes."""
+    mtime = os.path.getmtime(path)
+    cached = _cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with np.load(path) as npz:
+        sample_rate, frames, base_bin, scale = (int(v) for v in npz['meta'])
+        levels = []
+        while f'min_{len(levels)}' in npz:
+            i = len(levels)
+            levels.append((npz[f'min_{i}'], npz[f'max_{i}']))
+    peaks = {'sample_rate': sample_rate, 'frames': frames, 'base_bin': base_bin, 'scale': scale, 'levels': levels}
+    _cache[path] = (mtime, peaks)
+    return peaks
+
+
+def ensure_peaks(audio_path: str) -> Optional[str]:
+    """Create or refresh the sidecar for `audio_path`; returns its path, or None if the audio is missing."""
+    if not os.path.exists(audio_path):
+        return None
+    out = sidecar_path(audio_path)
+    st = os.stat(audio_path)
+    # ctime too: a file hardlinked or renamed over an old one keeps its (older) mtime
+    if os.path.exists(out) and os.path.getmtime(out) >= max(st.st_mtime, st.st_ctime):
+        return out
+    save_peaks(compute_peaks(audio_path), out)
+    return out
+
+
+def _signature(audio_path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(audio_path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def _ensure_logged(audio_path: str) -> Optional[str]:
+    try:
+        out = ensure_peaks(audio_path)
+    except Exception as e:
+        logger.warning('peaks for %s failed: %s', audio_path, e)
+        out = None
+    with _executor_lock:
+        if out is None:
+            _failed[audio_path] = _signature(audio_path)
+        else:
+            _failed.pop(audio_path, None)
+    return out
+
+
+def schedule_peaks(audio_path: str) -> Future:
+    """Compute the sidecar for `audio_path` on a single background worker thread.
+
+    A path that is already queued is not queued again, and a path whose last attempt failed
+    is only retried once the file changes, so callers (e.g. every Streamlit rerun) can call
+    this freely.
+    """
+    global _executor
+    with _executor_lock:
+        fut = _scheduled.get(audio_path)
+        if fut is not None:
+            return fut
+        if audio_path in _failed and _failed[audio_path] == _signature(audio_path):
+            fut = Future()
+            fut.set_result(None)
+            return fut
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='peaks')
+        fut = _executor.submit(_ensure_logged, audio_path)
+        _scheduled[audio_path] = fut
+    fut.add_done_callback(lambda _: _scheduled.pop(audio_path, None))
+    return fut
+
+
+def waveform(audio_path: str, width: int, start: float = 0.0, end: Optional[float] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Return (mins, maxs) float32 arrays in [-1, 1] with `width` points (fewer only when
+    the range spans fewer than `width` base bins) for the time range [start, end) in seconds, or None if the sidecar does not exist yet.
+    """
+    path = sidecar_path(audio_path)
+    if not os.path.exists(path):
+        return None
+    peaks = load_peaks(path)
+    sr, base_bin, levels = peaks['sample_rate'], peaks['base_bin'], peaks['levels']
+    first = max(0, int(start * sr))
+    last = peaks['frames'] if end is None else min(peaks['frames'], int(end * sr))
+    width = max(1, int(width))
+    if last <= first or not levels:
+        return np.zeros(0, dtype='float32'), np.zeros(0, dtype='float32')
+
+    # coarsest level that still has at least `width` bins across the range
+    level = 0
+    while level + 1 < len(levels) and (last - first) / (base_bin << (level + 1)) >= width:
+        level += 1
+    bin_size = base_bin << level
+    lo, hi = levels[level]
+    i0, i1 = first // bin_size, min(len(lo), -(-last // bin_size))
+    lo, hi = lo[i0:i1], hi[i0:i1]
+
+    # spread the bins over exactly min(width, bins) output points
+    if len(lo) > width:
+        edges = np.linspace(0, len(lo), width + 1).astype(np.intp)[:-1]
+        lo = np.minimum.reduceat(lo, edges)
+        hi = np.maximum.reduceat(hi, edges)
+    scale = np.float32(peaks['scale'])
+    return lo.astype('float32') / scale, hi.astype('float32') / scale
@@ -0,0 +1,443 @@
+"""Headless HTTP API for generation and library operations.
+
+Usage:
+    python server.py --port 8765 --workers 2
+
+A small asyncio HTTP/1.1 server (standard library only) with keep-alive connections.
+Rendering runs in a process pool so the event loop stays responsive; identical in-flight
+renders are coalesced so concurrent callers share one result. Rendered audio is returned as
+16-bit PCM WAV, written to the socket in chunks.
+
+Endpoints (JSON in, JSON out unless noted):
+    GET  /health
+    GET  /metrics                          Prometheus text from tracing.py
+    POST /generate     {prompt, duration, style, mood, save}        -> audio/wav
+    POST /musicgen     {prompt, duration, device, save}             -> audio/wav
+    POST /remix?intensity=&overlay_prompt=&mood=&save=  body: audio -> audio/wav
+    GET  /tracks
+    POST /tracks?title=&prompt=              body: audio (stored in the library folder)
+    GET  /tracks/<id>
+    GET  /tracks/<id>/audio                                         -> audio file
+    GET  /tracks/<id>/peaks?width=&start=&end=
+    GET  /playlists
+    POST /playlists    {name}
+    GET  /playlists/<id>/tracks
+    POST /playlists/<id>/tracks   {track_id}
+
+With `save` set, a render is also stored in the library and its track id is returned in the
+X-Track-Id header.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import library
+import tracing
+
+logger = logging.getLogger('mmusic.server')
+
+CHUNK_SIZE = 64 * 1024
+MAX_BODY = 100 * 1024 * 1024
+MAX_HEADER = 64 * 1024
+KEEP_ALIVE_TIMEOUT = 15.0
+_AUDIO_TYPES = {'.wav': 'audio/wav', '.mp3': 'audio/mpeg', '.flac': 'audio/flac', '.ogg': 'audio/ogg',
+                '.m4a': 'audio/mp4', '.webm': 'audio/webm'}
+_ENDPOINTS = {'health', 'metrics', 'generate', 'musicgen', 'remix', 'tracks', 'playlists'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = ''):
+        super().__init__(message)
+        self.status = status
+        self.message = message or HTTPStatus(status).phrase
+
+
+# --- work run in the process pool (module-level so it pickles) ---
+
+def _run_traced(fn, *args):
+    """Run one render in a worker and return (result, span stats for just this render).
+
+    Workers run one task at a time, so resetting first makes the snapshot exactly this
+    render's audio.*/remix.*/musicgen.* spans; the parent merges it into its /metrics.
+    """
+    tracing.reset()
+    result = fn(*args)
+    return result, tracing.snapshot()
+
+
+def _render_generate(prompt: str, duration: float, style: str, mood: float) -> bytes:
+    from audio_generator import encode_wav, generate_from_prompt
+    return encode_wav(generate_from_prompt(prompt, duration=duration, style=style, mood=mood))
+
+
+def _render_musicgen(prompt: str, duration: int, device: str) -> bytes:
+    from audio_generator import encode_wav
+    from musicgen_integration import generate_with_musicgen
+    return encode_wav(generate_with_musicgen(prompt, duration=duration, device=device))
+
+
+def _render_remix(data: bytes, intensity: float, overlay_prompt: Optional[str], mood: float) -> bytes:
+    from audio_generator import encode_wav, remix_audio_from_file
+    return encode_wav(remix_audio_from_file(io.BytesIO(data), intensity=intensity, overlay_prompt=overlay_prompt, mood=mood))
+
+
+def _warm_worker():
+    # pay numpy/scipy/soundfile import cost once per worker, not on the first request
+    import audio_generator  # noqa: F401
+    import scipy.signal  # noqa: F401
+    import soundfile  # noqa: F401
+
+
+def _number(params: Dict, key: str, default: float, lo: float, hi: float) -> float:
+    try:
+        value = float(params.get(key, default))
+    except (TypeError, ValueError):
+        raise HTTPError(400, f'{key} must be a number')
+    if not lo <= value <= hi:
+        raise HTTPError(400, f'{key} must be between {lo} and {hi}')
+    return value
+
+
+def _in_library(path: str) -> bool:
+    root = os.path.realpath(library.LIB_DIR)
+    try:
+        return os.path.commonpath([root, os.path.realpath(path)]) == root
+    except ValueError:  # different drives on Windows
+        return False
+
+
+def _flag(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+class MusicService:
+    def __init__(self, workers: Optional[int] = None):
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_warm_worker)
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        # library.json is rewritten whole on every change; serialize writers
+        self._library_lock = asyncio.Lock()
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    # --- plumbing ---
+
+    async def _render(self, fn, *args) -> bytes:
+        wav, stats = await asyncio.get_running_loop().run_in_executor(self._pool, _run_traced, fn, *args)
+        tracing.merge(stats)
+        return wav
+
+    async def _coalesced(self, key: Tuple, fn, *args) -> bytes:
+        """Run `fn(*args)` in the pool, sharing the result with identical in-flight requests."""
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._render(fn, *args))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            tracing.observe('server.coalesced', 0.0)
+        # shield: one caller disconnecting must not cancel the render for the others
+        return await asyncio.shield(fut)
+
+    async def _in_thread(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, partial(fn, *args, **kwargs))
+
+    async def _save_render(self, wav: bytes, prefix: str, title: str, prompt: str) -> Dict:
+        import soundfile as sf
+        duration = sf.info(io.BytesIO(wav)).duration
+        async with self._library_lock:
+            dest = await self._in_thread(library.store_audio, wav, prefix=prefix)
+            return await self._in_thread(library.add_track, title=title, file_path=dest, duration=duration, prompt=prompt)
+
+    # --- routes ---
+
+    async def dispatch(self, method: str, path: str, query: Dict, body: bytes):
+        """Return (status, content_type, payload, extra_headers). payload is bytes or a file path."""
+        parts = [p for p in path.split('/') if p]
+
+        if parts == ['health'] and method == 'GET':
+            return self._json({'status': 'ok'})
+        if parts == ['metrics'] and method == 'GET':
+            return 200, 'text/plain; version=0.0.4', tracing.render_prometheus().encode('utf-8'), {}
+
+        if parts == ['generate'] and method == 'POST':
+            params = self._parse_json(body)
+            prompt = str(params.get('prompt') or '').strip()
+            if not prompt:
+                raise HTTPError(400, 'prompt is required')
+            duration = _number(params, 'duration', 15, 1, 120)
+            mood = _number(params, 'mood', 0.0, -1.0, 1.0)
+            style = str(params.get('style') or 'lofi')
+            wav = await self._coalesced(('generate', prompt, duration, style, mood), _render_generate, prompt, duration, style, mood)
+            return await self._wav(wav, params.get('save'), 'gen', prompt[:60], prompt)
+
+        if parts == ['musicgen'] and method == 'POST':
+            from musicgen_integration import is_musicgen_available
+            if not is_musicgen_available():
+                raise HTTPError(503, 'MusicGen is not installed on this server')
+            params = self._parse_json(body)
+            prompt = str(params.get('prompt') or '').strip()
+            if not prompt:
+                raise HTTPError(400, 'prompt is required')
+            duration = int(_number(params, 'duration', 15, 1, 60))
+            device = str(params.get('device') or 'cpu')
+            wav = await self._coalesced(('musicgen', prompt, duration, device), _render_musicgen, prompt, duration, device)
+            return await self._wav(wav, params.get('save'), 'gen', prompt[:60], prompt)
+
+        if parts == ['remix'] and method == 'POST':
+            if not body:
+                raise HTTPError(400, 'request body must be the audio file to remix')
+            intensity = _number(query, 'intensity', 0.5, 0.0, 1.0)
+            mood = _number(query, 'mood', 0.0, -1.0, 1.0)
+            overlay = query.get('overlay_prompt') or None
+            # hashing up to MAX_BODY bytes would stall every connection if done on the loop
+            digest = await self._in_thread(lambda: hashlib.sha256(body).hexdigest())
+            key = ('remix', digest, intensity, overlay, mood)
+            wav = await self._coalesced(key, _render_remix, body, intensity, overlay, mood)
+            return await self._wav(wav, query.get('save'), 'remix', (overlay or 'Remix')[:60], overlay or '')
+
+        if parts and parts[0] == 'tracks':
+            return await self._tracks(method, parts[1:], query, body)
+        if parts and parts[0] == 'playlists':
+            return await self._playlists(method, parts[1:], body)
+        raise HTTPError(404)
+
+    async def _tracks(self, method: str, rest, query: Dict, body: bytes):
+        if not rest:
+            if method == 'GET':
+                return self._json(await self._in_thread(library.list_tracks))
+            if method == 'POST':
+                if not body:
+                    raise HTTPError(400, 'request body must be the audio file to add')
+                import soundfile as sf
+                try:
+                    info = await self._in_thread(sf.info, io.BytesIO(body))
+                except Exception:
+                    raise HTTPError(400, 'body is not a readable audio file')
+                ext = '.' + info.format.lower() if info.format in ('WAV', 'FLAC', 'OGG', 'MP3') else '.wav'
+                title = str(query.get('title') or 'Uploaded track')[:120]
+                async with self._library_lock:
+                    dest = await self._in_thread(library.store_audio, body, prefix='upload', ext=ext)
+                    track = await self._in_thread(library.add_track, title=title, file_path=dest,
+                                                  duration=info.duration, prompt=query.get('prompt'))
+                return self._json(track, status=201)
+            raise HTTPError(405)
+
+        track = await self._in_thread(library.find_track, rest[0])
+        if track is None:
+            raise HTTPError(404, 'no such track')
+        if len(rest) == 1 and method == 'GET':
+            return self._json(track)
+        if rest[1:] in (['audio'], ['peaks']) and not _in_library(track['file']):
+            # library.json is editable on disk; never serve anything outside the library folder
+            raise HTTPError(403, 'track file is outside the library folder')
+        if rest[1:] == ['audio'] and method == 'GET':
+            if not os.path.exists(track['file']):
+                raise HTTPError(404, 'track file is missing')
+            ctype = _AUDIO_TYPES.get(os.path.splitext(track['file'])[1].lower(), 'application/octet-stream')
+            return 200, ctype, track['file'], {}
+        if rest[1:] == ['peaks'] and method == 'GET':
+            import peaks
+            width = int(_number(query, 'width', 800, 1, 100000))
+            start = _number(query, 'start', 0.0, 0.0, 1e7)
+            end = float(query['end']) if query.get('end') else None
+            wave = await self._in_thread(peaks.waveform, track['file'], width, start, end)
+            if wave is None:
+                peaks.schedule_peaks(track['file'])
+                raise HTTPError(404, 'peaks are not computed yet; try again shortly')
+            return self._json({'min': wave[0].tolist(), 'max': wave[1].tolist()})
+        raise HTTPError(404)
+
+    async def _playlists(self, method: str, rest, body: bytes):
+        if not rest:
+            if method == 'GET':
+                return self._json(await self._in_thread(library.list_playlists))
+            if method == 'POST':
+                name = str(self._parse_json(body).get('name') or '').strip()
+                if not name:
+                    raise HTTPError(400, 'name is required')
+                async with self._library_lock:
+                    return self._json(await self._in_thread(library.add_playlist, name), status=201)
+            raise HTTPError(405)
+        if rest[1:] == ['tracks']:
+            if method == 'GET':
+                return self._json(await self._in_thread(library.list_tracks_in_playlist, rest[0]))
+            if method == 'POST':
+                track_id = self._parse_json(body).get('track_id')
+                async with self._library_lock:
+                    ok = await self._in_thread(library.add_track_to_playlist, rest[0], track_id)
+                if not ok:
+                    raise HTTPError(404, 'no such playlist')
+                return self._json({'ok': True})
+            raise HTTPError(405)
+        raise HTTPError(404)
+
+    async def _wav(self, wav: bytes, save, prefix: str, title: str, prompt: str):
+        headers = {'Content-Disposition': f'inline; filename="{prefix}.wav"'}
+        if _flag(save):
+            track = await self._save_render(wav, prefix, title or prefix, prompt)
+            headers['X-Track-Id'] = track['id']
+        return 200, 'audio/wav', wav, headers
+
+    @staticmethod
+    def _json(obj, status: int = 200):
+        return status, 'application/json', json.dumps(obj, ensure_ascii=False).encode('utf-8'), {}
+
+    @staticmethod
+    def _parse_json(body: bytes) -> Dict:
+        if not body:
+            return {}
+        try:
+            params = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, 'body must be JSON')
+        if not isinstance(params, dict):
+            raise HTTPError(400, 'body must be a JSON object')
+        return params
+
+    # --- HTTP/1.1 ---
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                keep_alive = await self._handle_request(head, reader, writer)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, head: bytes, reader, writer) -> bool:
+        started = time.perf_counter()
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            await self._respond(writer, 400, 'application/json', b'{"error": "bad request line"}', {}, False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                k, v = line.split(':', 1)
+                headers[k.strip().lower()] = v.strip()
+        conn = headers.get('connection', '').lower()
+        keep_alive = conn != 'close' if version == 'HTTP/1.1' else conn == 'keep-alive'
+
+        url = urlsplit(target)
+        route = url.path
+        try:
+            # errors raised before the body is consumed leave it unread on the socket, so the
+            # connection must close or the body would be parsed as the next request
+            try:
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    raise HTTPError(411, 'send a Content-Length instead of chunked encoding')
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    raise HTTPError(400, 'invalid Content-Length')
+                if length < 0:
+                    raise HTTPError(400, 'invalid Content-Length')
+                if length > MAX_BODY:
+                    raise HTTPError(413)
+            except HTTPError:
+                keep_alive = False
+                raise
+            body = await reader.readexactly(length) if length else b''
+            status, ctype, payload, extra = await self.dispatch(method.upper(), url.path, dict(parse_qsl(url.query)), body)
+        except asyncio.IncompleteReadError:
+            return False
+        except HTTPError as e:
+            status, ctype, payload, extra = self._json({'error': e.message}, status=e.status)
+        except ValueError as e:
+            status, ctype, payload, extra = self._json({'error': str(e)}, status=400)
+        except ImportError as e:
+            status, ctype, payload, extra = self._json({'error': str(e)}, status=503)
+        except Exception as e:
+            logger.exception('%s %s failed', method, route)
+            status, ctype, payload, extra = self._json({'error': f'{type(e).__name__}: {e}'}, status=500)
+
+        try:
+            await self._respond(writer, status, ctype, payload, extra, keep_alive)
+        except ConnectionError:
+            return False
+        endpoint = route.strip('/').split('/', 1)[0]
+        if endpoint not in _ENDPOINTS:
+            endpoint = 'other'  # keep metric labels bounded
+        tracing.observe(f'server.{endpoint}', time.perf_counter() - started, method=method, status=status)
+        return keep_alive
+
+    async def _respond(self, writer, status: int, ctype: str, payload, extra: Dict, keep_alive: bool):
+        is_file = isinstance(payload, str)
+        length = os.path.getsize(payload) if is_file else len(payload)
+        head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+                f'Content-Type: {ctype}',
+                f'Content-Length: {length}',
+                'Connection: keep-alive' if keep_alive else 'Connection: close']
+        if keep_alive:
+            head.append(f'Keep-Alive: timeout={int(KEEP_ALIVE_TIMEOUT)}')
+        head += [f'{k}: {v}' for k, v in extra.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+
+        if is_file:
+            with open(payload, 'rb') as f:
+                while True:
+                    chunk = await self._in_thread(f.read, CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+                    await writer.drain()
+        else:
+            view = memoryview(payload)
+            for i in range(0, length, CHUNK_SIZE):
+                writer.write(view[i:i + CHUNK_SIZE])
+                await writer.drain()
+        await writer.drain()
+
+
+async def serve(host: str, port: int, workers: Optional[int] = None):
+    service = MusicService(workers=workers)
+    server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEADER)
+    logger.info('listening on http://%s:%d', host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='M Music App HTTP API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: CPU count)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Lightweight timing spans for the generate/remix/library hot paths.
+
+Wrap a stage with ``with span('name'):`` or decorate a function with ``@traced('name')``.
+Every finished span updates an in-process aggregate (count / total / max seconds) which can be
+exported as Prometheus text (``render_prometheus``) or served over HTTP (``start_metrics_server``).
+
+Environment variables:
+    MMUSIC_TRACE_LOG=1          also emit one structured JSON log line per span (logger ``mmusic.trace``)
+    MMUSIC_METRICS_PORT=9108    serve ``/metrics`` in a background thread on that port
+    MMUSIC_PROFILE=cprofile     wrap each top-level span in cProfile and dump stats to MMUSIC_PROFILE_DIR
+    MMUSIC_PROFILE=tracemalloc  record peak allocations per top-level span (process-wide, so
+                                allocations by other threads during the span are included)
+
+With profiling off a span costs two ``perf_counter`` calls and a dict update under a lock.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger('mmusic.trace')
+
+_LOG_SPANS = os.environ.get('MMUSIC_TRACE_LOG', '') not in ('', '0')
+_PROFILE_MODE = os.environ.get('MMUSIC_PROFILE', '').strip().lower()
+_PROFILE_DIR = os.environ.get('MMUSIC_PROFILE_DIR') or os.path.join(os.path.dirname(__file__), 'profiles')
+
+if (_LOG_SPANS or _PROFILE_MODE) and not logger.handlers:
+    # the env vars are the opt-in; don't depend on the host app configuring logging
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_lock = threading.Lock()
+# cProfile can only be active in one thread at a time (enforced on Python 3.12+), and
+# tracemalloc's peak is process-wide; either way only one outermost span is profiled at once
+_profile_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+_local = threading.local()
+
+
+def _record(name: str, elapsed: float):
+    with _lock:
+        s = _stats.get(name)
+        if s is None:
+            s = _stats[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        s['count'] += 1
+        s['total'] += elapsed
+        if elapsed > s['max']:
+            s['max'] = elapsed
+
+
+@contextmanager
+def _profiled(name: str):
+    """Profile the outermost span on this thread when MMUSIC_PROFILE is set."""
+    if _PROFILE_MODE == 'cprofile':
+        import cProfile
+        # another thread is already profiling: time this span but don't profile it
+        if not _profile_lock.acquire(blocking=False):
+            yield
+            return
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # a profiler not owned by this module is active
+            _profile_lock.release()
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            _profile_lock.release()
+            os.makedirs(_PROFILE_DIR, exist_ok=True)
+            out = os.path.join(_PROFILE_DIR, f"{name}_{int(time.time() * 1000)}.prof")
+            prof.dump_stats(out)
+            logger.info(json.dumps({'event': 'profile', 'span': name, 'file': out}))
+    elif _PROFILE_MODE == 'tracemalloc':
+        import tracemalloc
+        # tracemalloc is process-global: a second span calling reset_peak()/stop() would
+        # corrupt this one's peak, so only one outermost span measures at a time
+        if not _profile_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                if started:
+                    tracemalloc.stop()
+                logger.info(json.dumps({'event': 'tracemalloc', 'span': name, 'peak_bytes': peak}))
+        finally:
+            _profile_lock.release()
+    else:
+        yield
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the enclosed block and record it under ``name``.
+
+    Nested spans are recorded under their own name; the parent name is included in the
+    structured log line so a trace can be reconstructed.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    outermost = parent is None and _PROFILE_MODE in ('cprofile', 'tracemalloc')
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        if outermost:
+            with _profiled(name):
+                yield
+        else:
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        _record(name, elapsed)
+        if _LOG_SPANS:
+            entry = {'event': 'span', 'span': name, 'parent': parent, 'seconds': round(elapsed, 6)}
+            if attrs:
+                entry.update(attrs)
+            logger.info(json.dumps(entry, default=str))
+
+
+def observe(name: str, seconds: float, **attrs):
+    """Record an externally timed duration, e.g. from async code where ``span``'s
+    per-thread nesting would interleave across coroutines."""
+    _record(name, seconds)
+    if _LOG_SPANS:
+        entry = {'event': 'span', 'span': name, 'parent': None, 'seconds': round(seconds, 6)}
+        if attrs:
+            entry.update(attrs)
+        logger.info(json.dumps(entry, default=str))
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of ``span``; defaults to the function's qualified name."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Return a copy of the aggregated span stats keyed by span name."""
+    with _lock:
+        return {k: dict(v) for k, v in _stats.items()}
+
+
+def merge(stats: Dict[str, Dict[str, float]]):
+    """Fold stats from another process (a ``snapshot()``) into this process's aggregates."""
+    with _lock:
+        for name, other in stats.items():
+            s = _stats.get(name)
+            if s is None:
+                _stats[name] = dict(other)
+                continue
+            s['count'] += other['count']
+            s['total'] += other['total']
+            if other['max'] > s['max']:
+                s['max'] = other['max']
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def render_prometheus() -> str:
+    """Render the span aggregates in the Prometheus text exposition format."""
+    lines = [
+        '# HELP mmusic_span_seconds_total Total time spent in a traced span.',
+        '# TYPE mmusic_span_seconds_total counter',
+    ]
+    stats = snapshot()
+    for name in sorted(stats):
+        lines.append(f'mmusic_span_seconds_total{{span="{name}"}} {stats[name]["total"]:.6f}')
+    lines += [
+        '# HELP mmusic_span_calls_total Number of times a traced span finished.',
+        '# TYPE mmusic_span_calls_total counter',
+    ]
+    for name in sorted(stats):
+        lines.append(f'mmusic_span_calls_total{{span="{name}"}} {int(stats[name]["count"])}')
+    lines += [
+        '# HELP mmusic_span_seconds_max Slowest single run of a traced span.',
+        '# TYPE mmusic_span_seconds_max gauge',
+    ]
+    for name in sorted(stats):
+        lines.append(f'mmusic_span_seconds_max{{span="{name}"}} {stats[name]["max"]:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+_server = None
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1'):
+    """Serve ``GET /metrics`` from a daemon thread. Safe to call more than once."""
+    global _server
+    if _server is not None:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=_server.serve_forever, name='mmusic-metrics', daemon=True).start()
+    return _server
+
+
+_port = os.environ.get('MMUSIC_METRICS_PORT')
+if _port:
+    try:
+        start_metrics_server(int(_port))
+    except (OSError, ValueError) as e:
+        logger.warning('metrics server not started: %s', e)